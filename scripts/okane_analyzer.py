@@ -5,54 +5,122 @@ okane-backup JSONファイルの分析・予測スクリプト
 
 import json
 import argparse
+import os
+import shutil
 import subprocess
 import sys
+import tempfile
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
-from collections import defaultdict
+from itertools import accumulate, islice
+from operator import itemgetter
+from string import Template
+from typing import NamedTuple
 from dateutil.relativedelta import relativedelta
 
-# グラフ用（オプション）
-try:
-    import matplotlib.pyplot as plt
-    import matplotlib.dates as mdates
-    from matplotlib import rcParams
-    # 日本語フォント設定
-    rcParams['font.family'] = 'sans-serif'
-    rcParams['font.sans-serif'] = ['Hiragino Sans', 'Hiragino Kaku Gothic ProN', 'Yu Gothic', 'Meiryo', 'sans-serif']
-    HAS_MATPLOTLIB = True
-except ImportError:
-    HAS_MATPLOTLIB = False
+# 取引の並び替えキー（'YYYY-MM-DD' は文字列順 = 日付順）
+_DATE_KEY = itemgetter('date')
 
 
 def load_json(file_path: str) -> dict:
     """JSONファイルを読み込む"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(file_path, 'rb') as f:
+        data = json.loads(f.read().decode('utf-8'))
+    # 取引を日付順に並べておく
+    data['transactions'].sort(key=_DATE_KEY)
+    return data
 
 
 def save_json(file_path: str, data: dict):
     """JSONファイルを保存"""
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    content = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+    # 一時ファイルに書いてから置き換える（リンク先を更新し、元の権限を引き継ぐ）
+    real_path = os.path.realpath(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(real_path), prefix='.okane-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        if os.path.exists(real_path):
+            shutil.copymode(real_path, tmp_path)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, real_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
 def format_currency(amount: int) -> str:
     """金額をフォーマット"""
-    if amount >= 0:
-        return f"¥{amount:,}"
-    return f"-¥{abs(amount):,}"
+    return f"¥{amount:,}" if amount >= 0 else f"-¥{-amount:,}"
+
+
+class _BalanceIndex(NamedTuple):
+    """日付順に並べた取引と、その列ごとのリスト
+
+    balances[i] は transactions[i]（日付 dates[i]）までを反映した残高
+    """
+    transactions: list
+    dates: list
+    balances: list
+
+
+def _to_columns(transactions: list) -> tuple:
+    """取引リストを日付リストと符号付き金額リスト（収入は正、支出は負）に分解"""
+    dates = [t['date'] for t in transactions]
+    signed_amounts = [t['amount'] if t['type'] == 'income' else -t['amount'] for t in transactions]
+    return dates, signed_amounts
+
+
+def _build_balance_index(data: dict) -> _BalanceIndex:
+    """日付順の取引リスト・取引日リスト・累積残高リストを作成"""
+    # load_json で整列済みならほぼ線形時間で終わる
+    transactions = sorted(data['transactions'], key=_DATE_KEY)
+    dates, signed_amounts = _to_columns(transactions)
+    balances = list(islice(accumulate(signed_amounts, initial=data.get('initialBalance', 0)), 1, None))
+    return _BalanceIndex(transactions, dates, balances)
+
+
+def _balance_query(index: _BalanceIndex, initial: int):
+    """累積残高インデックスから指定日時点の残高を二分探索で返す関数を作成"""
+    dates = index.dates
+    balances = index.balances
+
+    def query(target_date: str) -> int:
+        idx = bisect_right(dates, target_date) - 1
+        return initial if idx < 0 else balances[idx]
+
+    return query
+
+
+def _daily_balances(index: _BalanceIndex, initial: int, days: list) -> list:
+    """昇順の日付文字列リストに対する各日の残高を計算
+
+    日付が昇順なので、前回の探索位置を下限にして二分探索する
+    """
+    dates, balances = index.dates, index.balances
+    result = []
+    lo = 0
+    for day in days:
+        lo = bisect_right(dates, day, lo)
+        result.append(balances[lo - 1] if lo else initial)
+    return result
+
+
+def make_balance_query(data: dict):
+    """指定日時点の残高を返す関数を作成
+
+    同じデータに何度も問い合わせる場合は、これで作った関数を使い回す
+    """
+    return _balance_query(_build_balance_index(data), data.get('initialBalance', 0))
 
 
 def get_balance_at_date(data: dict, target_date: str) -> int:
     """指定日時点の残高を計算"""
-    balance = data.get('initialBalance', 0)
-    for t in data['transactions']:
-        if t['date'] <= target_date:
-            if t['type'] == 'income':
-                balance += t['amount']
-            else:
-                balance -= t['amount']
-    return balance
+    return make_balance_query(data)(target_date)
 
 
 def compress_logs(data: dict, keep_months: int = 3) -> dict:
@@ -63,38 +131,40 @@ def compress_logs(data: dict, keep_months: int = 3) -> dict:
     today = datetime.now()
     cutoff = (today - relativedelta(months=keep_months)).strftime('%Y-%m')
 
-    old_transactions = []
+    # 'YYYY-MM-DD' は文字列比較で日付順になるため、月初と直接比較する
+    cutoff_date = f'{cutoff}-01'
+
     new_transactions = []
-    monthly_summary = defaultdict(lambda: {'income': 0, 'expense': 0})
+    income_by_month = {}
+    expense_by_month = {}
 
     for t in data['transactions']:
-        month = t['date'][:7]
-        if month < cutoff:
-            if t['type'] == 'income':
-                monthly_summary[month]['income'] += t['amount']
-            else:
-                monthly_summary[month]['expense'] += t['amount']
-        else:
+        if t['date'] >= cutoff_date:
             new_transactions.append(t)
+            continue
+        month = t['date'][:7]
+        totals = income_by_month if t['type'] == 'income' else expense_by_month
+        totals[month] = totals.get(month, 0) + t['amount']
 
     # 月次サマリーを圧縮トランザクションに変換
     compressed = []
-    for month in sorted(monthly_summary.keys()):
-        s = monthly_summary[month]
-        if s['income'] > 0:
+    for month in sorted(income_by_month.keys() | expense_by_month.keys()):
+        income = income_by_month.get(month, 0)
+        expense = expense_by_month.get(month, 0)
+        if income > 0:
             compressed.append({
                 'id': f'compressed-{month}-income',
                 'date': f'{month}-01',
                 'type': 'income',
-                'amount': s['income'],
+                'amount': income,
                 'description': f'{month}収入合計（圧縮）'
             })
-        if s['expense'] > 0:
+        if expense > 0:
             compressed.append({
                 'id': f'compressed-{month}-expense',
                 'date': f'{month}-01',
                 'type': 'expense',
-                'amount': s['expense'],
+                'amount': expense,
                 'description': f'{month}支出合計（圧縮）'
             })
 
@@ -106,11 +176,15 @@ def compress_logs(data: dict, keep_months: int = 3) -> dict:
     return new_data
 
 
-def forecast_balance(data: dict, months_ahead: int = 6) -> list:
+def forecast_balance(data: dict, months_ahead: int = 6, index: _BalanceIndex = None) -> list:
     """将来の残高を予測
 
     既存の将来取引を考慮して残高推移を表示
+    index: 作成済みの累積残高インデックス（省略時はここで作成）
     """
+    if index is None:
+        index = _build_balance_index(data)
+    balance_at = _balance_query(index, data.get('initialBalance', 0))
     today = datetime.now()
     results = []
 
@@ -124,14 +198,13 @@ def forecast_balance(data: dict, months_ahead: int = 6) -> list:
             next_month = target.replace(day=28) + timedelta(days=4)
             target_date = (next_month - timedelta(days=next_month.day)).strftime('%Y-%m-%d')
 
-        balance = get_balance_at_date(data, target_date)
+        balance = balance_at(target_date)
 
-        # その月の大きな出入りを抽出
+        # その月の大きな出入りを抽出（その月の範囲だけを二分探索で切り出す）
         month_str = target.strftime('%Y-%m')
-        big_items = []
-        for t in data['transactions']:
-            if t['date'].startswith(month_str) and t['amount'] >= 100000:
-                big_items.append(t)
+        lo = bisect_left(index.dates, month_str)
+        hi = bisect_right(index.dates, f'{month_str}-31', lo)
+        big_items = [t for t in index.transactions[lo:hi] if t['amount'] >= 100000]
 
         results.append({
             'month': month_str,
@@ -145,18 +218,23 @@ def forecast_balance(data: dict, months_ahead: int = 6) -> list:
 
 def check_affordability(data: dict, amount: int, target_date: str) -> dict:
     """指定日に指定金額の出費が可能かチェック"""
+    index = _build_balance_index(data)
+    transactions = index.transactions
+
     # 出費前の残高
-    balance_before = get_balance_at_date(data, target_date)
+    balance_before = _balance_query(index, data.get('initialBalance', 0))(target_date)
     balance_after = balance_before - amount
 
-    # その日以降の予定支出を取得
+    # その日以降の予定支出を次の5件だけ取得
     upcoming_expenses = []
-    for t in data['transactions']:
-        if t['date'] > target_date and t['type'] == 'expense':
-            upcoming_expenses.append(t)
+    for i in range(bisect_right(index.dates, target_date), len(transactions)):
+        if transactions[i]['type'] == 'expense':
+            upcoming_expenses.append(transactions[i])
+            if len(upcoming_expenses) == 5:
+                break
 
     # 次の大きな支出までの余裕
-    total_upcoming = sum(t['amount'] for t in upcoming_expenses[:5])  # 次の5件
+    total_upcoming = sum(t['amount'] for t in upcoming_expenses)
 
     return {
         'target_date': target_date,
@@ -165,52 +243,31 @@ def check_affordability(data: dict, amount: int, target_date: str) -> dict:
         'balance_after': balance_after,
         'can_afford': balance_after >= 0,
         'safety_margin': balance_after,
-        'upcoming_expenses': upcoming_expenses[:5],
+        'upcoming_expenses': upcoming_expenses,
         'warning': balance_after < 100000  # 10万円以下は警告
     }
 
 
-def find_danger_points(data: dict, threshold: int = 0) -> list:
-    """残高が危険水準を下回るポイントを検出"""
-    # 全取引を日付順にソート
-    transactions = sorted(data['transactions'], key=lambda x: x['date'])
-
-    balance = data.get('initialBalance', 0)
-    danger_points = []
-    balance_history = []
+def find_danger_points(data: dict, threshold: int = 0, index: _BalanceIndex = None) -> list:
+    """残高が危険水準を下回るポイントを検出
 
-    current_date = None
-    daily_balance = balance
-
-    for t in transactions:
-        if current_date and t['date'] != current_date:
-            balance_history.append({'date': current_date, 'balance': daily_balance})
-            if daily_balance <= threshold:
-                danger_points.append({
-                    'date': current_date,
-                    'balance': daily_balance,
-                    'shortfall': threshold - daily_balance
-                })
+    index: 作成済みの累積残高インデックス（省略時はここで作成）
+    """
+    if index is None:
+        index = _build_balance_index(data)
 
-        if t['type'] == 'income':
-            balance += t['amount']
-        else:
-            balance -= t['amount']
-
-        daily_balance = balance
-        current_date = t['date']
-
-    # 最後の日
-    if current_date:
-        balance_history.append({'date': current_date, 'balance': daily_balance})
-        if daily_balance <= threshold:
-            danger_points.append({
-                'date': current_date,
-                'balance': daily_balance,
-                'shortfall': threshold - daily_balance
-            })
+    # 日付ごとに最後の取引時点の残高だけを残す（日付順は保たれる）
+    daily_balance = dict(zip(index.dates, index.balances))
 
-    return danger_points
+    return [
+        {
+            'date': date_str,
+            'balance': balance,
+            'shortfall': threshold - balance
+        }
+        for date_str, balance in daily_balance.items()
+        if balance <= threshold
+    ]
 
 
 def print_forecast(results: list):
@@ -272,47 +329,68 @@ def print_danger_points(points: list):
         print(f"| {p['date']} | {format_currency(p['balance'])} | {format_currency(p['shortfall'])} |")
 
 
-def generate_balance_chart(data: dict, months_ahead: int = 6, output_path: str = None, open_file: bool = False) -> str:
-    """残高推移グラフを生成"""
-    if not HAS_MATPLOTLIB:
-        print("❌ matplotlib がインストールされていません")
-        return None
+def _build_chart_series(data: dict, months_ahead: int):
+    """グラフ用の日ごとの残高推移と、大きな取引（20万円以上）のマーカーデータを作成
 
-    # 全取引を日付順にソート
-    transactions = sorted(data['transactions'], key=lambda x: x['date'])
-
-    if not transactions:
-        print("❌ 取引データがありません")
+    最初の取引日から months_ahead ヶ月後までを対象とする。
+    取引がない場合は None を返す
+    """
+    index = _build_balance_index(data)
+    if not index.dates:
         return None
+    initial = data.get('initialBalance', 0)
 
-    # 日付ごとの残高を計算
-    balance = data.get('initialBalance', 0)
-    dates = []
-    balances = []
-
-    # 開始日から終了日までの残高推移
-    start_date = datetime.strptime(transactions[0]['date'], '%Y-%m-%d')
+    start_date = datetime.fromisoformat(index.dates[0])
     end_date = datetime.now() + relativedelta(months=months_ahead)
+    start_str = index.dates[0]
+    end_str = end_date.date().isoformat()
 
     # 日ごとの残高を計算
-    current_date = start_date
-    tx_index = 0
+    start_day = start_date.date()
+    days = [(start_day + timedelta(days=i)).isoformat()
+            for i in range((end_date - start_date).days + 1)]
+    balances = _daily_balances(index, initial, days)
 
-    while current_date <= end_date:
-        date_str = current_date.strftime('%Y-%m-%d')
+    # 大きな取引のマーカーデータ
+    balance_at = _balance_query(index, initial)
+    big_transactions = []
+    for t in data['transactions']:
+        if t['amount'] >= 200000:  # 20万円以上
+            t_date = t['date']
+            if start_str <= t_date <= end_str:
+                big_transactions.append({
+                    'date': t_date,
+                    'balance': balance_at(t_date),
+                    'description': t['description'],
+                    'amount': t['amount'],
+                    'type': t['type']
+                })
+
+    return start_date, days, balances, big_transactions
+
+
+def generate_balance_chart(data: dict, months_ahead: int = 6, output_path: str = None, open_file: bool = False) -> str:
+    """残高推移グラフを生成"""
+    # グラフ用（オプション）: 他のコマンドの起動を遅くしないよう、ここで読み込む
+    try:
+        import matplotlib.pyplot as plt
+        import matplotlib.dates as mdates
+        from matplotlib import rcParams
+    except ImportError:
+        print("❌ matplotlib がインストールされていません")
+        return None
 
-        # その日の取引を処理
-        while tx_index < len(transactions) and transactions[tx_index]['date'] <= date_str:
-            t = transactions[tx_index]
-            if t['type'] == 'income':
-                balance += t['amount']
-            else:
-                balance -= t['amount']
-            tx_index += 1
+    # 日本語フォント設定
+    rcParams['font.family'] = 'sans-serif'
+    rcParams['font.sans-serif'] = ['Hiragino Sans', 'Hiragino Kaku Gothic ProN', 'Yu Gothic', 'Meiryo', 'sans-serif']
 
-        dates.append(current_date)
-        balances.append(balance)
-        current_date += timedelta(days=1)
+    # 日ごとの残高推移と大きな取引のマーカーデータ
+    series = _build_chart_series(data, months_ahead)
+    if series is None:
+        print("❌ 取引データがありません")
+        return None
+    start_date, days, balances, big_transactions = series
+    dates = [start_date + timedelta(days=i) for i in range(len(days))]
 
     # グラフ作成
     fig, ax = plt.subplots(figsize=(12, 6))
@@ -325,21 +403,18 @@ def generate_balance_chart(data: dict, months_ahead: int = 6, output_path: str =
     ax.axvline(x=today, color='g', linestyle='--', alpha=0.5, label='今日')
 
     # 大きな出入りにマーカー
-    for t in data['transactions']:
-        if t['amount'] >= 200000:  # 20万円以上
-            t_date = datetime.strptime(t['date'], '%Y-%m-%d')
-            if start_date <= t_date <= end_date:
-                balance_at_date = get_balance_at_date(data, t['date'])
-                color = 'green' if t['type'] == 'income' else 'red'
-                marker = '^' if t['type'] == 'income' else 'v'
-                ax.scatter([t_date], [balance_at_date], color=color, s=100, marker=marker, zorder=5)
-                # ラベル
-                ax.annotate(f"{t['description']}\n{format_currency(t['amount'])}",
-                           (t_date, balance_at_date),
-                           textcoords="offset points",
-                           xytext=(0, 15 if t['type'] == 'income' else -25),
-                           ha='center', fontsize=8,
-                           bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.7))
+    for t in big_transactions:
+        t_date = datetime.fromisoformat(t['date'])
+        color = 'green' if t['type'] == 'income' else 'red'
+        marker = '^' if t['type'] == 'income' else 'v'
+        ax.scatter([t_date], [t['balance']], color=color, s=100, marker=marker, zorder=5)
+        # ラベル
+        ax.annotate(f"{t['description']}\n{format_currency(t['amount'])}",
+                   (t_date, t['balance']),
+                   textcoords="offset points",
+                   xytext=(0, 15 if t['type'] == 'income' else -25),
+                   ha='center', fontsize=8,
+                   bbox=dict(boxstyle='round,pad=0.3', facecolor='white', alpha=0.7))
 
     # 軸設定
     ax.set_xlabel('日付')
@@ -377,71 +452,21 @@ def generate_balance_chart(data: dict, months_ahead: int = 6, output_path: str =
 
 
 def open_file_in_os(file_path: str):
-    """OSに応じてファイルを開く"""
-    if sys.platform == 'darwin':  # macOS
-        subprocess.run(['open', file_path])
-    elif sys.platform == 'win32':  # Windows
-        subprocess.run(['start', file_path], shell=True)
-    else:  # Linux
-        subprocess.run(['xdg-open', file_path])
-
-
-def generate_interactive_chart(data: dict, months_ahead: int = 6, output_path: str = None, open_file: bool = False) -> str:
-    """インタラクティブなHTML残高推移グラフを生成"""
-
-    # 全取引を日付順にソート
-    transactions = sorted(data['transactions'], key=lambda x: x['date'])
-
-    if not transactions:
-        print("❌ 取引データがありません")
-        return None
-
-    # 日付ごとの残高を計算
-    balance = data.get('initialBalance', 0)
-    start_date = datetime.strptime(transactions[0]['date'], '%Y-%m-%d')
-    end_date = datetime.now() + relativedelta(months=months_ahead)
-
-    # 日ごとの残高を計算
-    dates = []
-    balances = []
-    current_date = start_date
-    tx_index = 0
-
-    while current_date <= end_date:
-        date_str = current_date.strftime('%Y-%m-%d')
-
-        while tx_index < len(transactions) and transactions[tx_index]['date'] <= date_str:
-            t = transactions[tx_index]
-            if t['type'] == 'income':
-                balance += t['amount']
-            else:
-                balance -= t['amount']
-            tx_index += 1
-
-        dates.append(date_str)
-        balances.append(balance)
-        current_date += timedelta(days=1)
+    """OSに応じてファイルを開く（終了を待たない）"""
+    if sys.platform == 'win32':  # Windows
+        os.startfile(file_path)
+        return
 
-    # 大きな取引のマーカーデータ
-    big_transactions = []
-    for t in data['transactions']:
-        if t['amount'] >= 200000:
-            t_date = t['date']
-            if start_date.strftime('%Y-%m-%d') <= t_date <= end_date.strftime('%Y-%m-%d'):
-                balance_at = get_balance_at_date(data, t_date)
-                big_transactions.append({
-                    'date': t_date,
-                    'balance': balance_at,
-                    'description': t['description'],
-                    'amount': t['amount'],
-                    'type': t['type']
-                })
+    command = 'open' if sys.platform == 'darwin' else 'xdg-open'  # macOS / Linux
+    subprocess.Popen([command, file_path],
+                     stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL,
+                     start_new_session=True)
 
-    # 今日の日付
-    today = datetime.now().strftime('%Y-%m-%d')
 
-    # HTML生成
-    html_content = f'''<!DOCTYPE html>
+# インタラクティブグラフのHTMLテンプレート（$名前 の箇所にデータを埋め込む）
+_HTML_TEMPLATE = Template('''<!DOCTYPE html>
 <html lang="ja">
 <head>
     <meta charset="UTF-8">
@@ -449,28 +474,28 @@ def generate_interactive_chart(data: dict, months_ahead: int = 6, output_path: s
     <title>残高推移予測</title>
     <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
     <style>
-        body {{
+        body {
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
             margin: 0;
             padding: 20px;
             background: #f5f5f5;
-        }}
-        h1 {{
+        }
+        h1 {
             text-align: center;
             color: #333;
-        }}
-        #chart {{
+        }
+        #chart {
             width: 100%;
             height: 600px;
             background: white;
             border-radius: 8px;
             box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        .info {{
+        }
+        .info {
             text-align: center;
             color: #666;
             margin-top: 10px;
-        }}
+        }
     </style>
 </head>
 <body>
@@ -479,96 +504,122 @@ def generate_interactive_chart(data: dict, months_ahead: int = 6, output_path: s
     <p class="info">グラフ上をホバーで詳細表示 / ドラッグでズーム / ダブルクリックでリセット</p>
 
     <script>
-        const dates = {json.dumps(dates)};
-        const balances = {json.dumps(balances)};
-        const bigTransactions = {json.dumps(big_transactions, ensure_ascii=False)};
-        const today = "{today}";
+        const dates = $dates_json;
+        const balances = $balances_json;
+        const bigTransactions = $big_transactions_json;
+        const today = "$today";
 
         // メインの残高ライン
-        const balanceLine = {{
+        const balanceLine = {
             x: dates,
             y: balances,
             type: 'scatter',
             mode: 'lines',
             name: '残高',
-            line: {{ color: '#2196F3', width: 2 }},
-            hovertemplate: '%{{x}}<br>残高: ¥%{{y:,.0f}}<extra></extra>'
-        }};
+            line: { color: '#2196F3', width: 2 },
+            hovertemplate: '%{x}<br>残高: ¥%{y:,.0f}<extra></extra>'
+        };
 
         // 収入マーカー
-        const incomeMarkers = {{
+        const incomeMarkers = {
             x: bigTransactions.filter(t => t.type === 'income').map(t => t.date),
             y: bigTransactions.filter(t => t.type === 'income').map(t => t.balance),
             type: 'scatter',
             mode: 'markers',
             name: '収入（20万以上）',
-            marker: {{ color: '#4CAF50', size: 12, symbol: 'triangle-up' }},
+            marker: { color: '#4CAF50', size: 12, symbol: 'triangle-up' },
             text: bigTransactions.filter(t => t.type === 'income').map(t => t.description + '<br>+¥' + t.amount.toLocaleString()),
-            hovertemplate: '%{{x}}<br>%{{text}}<br>残高: ¥%{{y:,.0f}}<extra></extra>'
-        }};
+            hovertemplate: '%{x}<br>%{text}<br>残高: ¥%{y:,.0f}<extra></extra>'
+        };
 
         // 支出マーカー
-        const expenseMarkers = {{
+        const expenseMarkers = {
             x: bigTransactions.filter(t => t.type === 'expense').map(t => t.date),
             y: bigTransactions.filter(t => t.type === 'expense').map(t => t.balance),
             type: 'scatter',
             mode: 'markers',
             name: '支出（20万以上）',
-            marker: {{ color: '#f44336', size: 12, symbol: 'triangle-down' }},
+            marker: { color: '#f44336', size: 12, symbol: 'triangle-down' },
             text: bigTransactions.filter(t => t.type === 'expense').map(t => t.description + '<br>-¥' + t.amount.toLocaleString()),
-            hovertemplate: '%{{x}}<br>%{{text}}<br>残高: ¥%{{y:,.0f}}<extra></extra>'
-        }};
+            hovertemplate: '%{x}<br>%{text}<br>残高: ¥%{y:,.0f}<extra></extra>'
+        };
 
-        const layout = {{
-            xaxis: {{
+        const layout = {
+            xaxis: {
                 title: '日付',
                 showgrid: true,
                 gridcolor: '#eee'
-            }},
-            yaxis: {{
+            },
+            yaxis: {
                 title: '残高（円）',
                 showgrid: true,
                 gridcolor: '#eee',
                 tickformat: ',.0f',
                 tickprefix: '¥'
-            }},
-            shapes: [{{
+            },
+            shapes: [{
                 type: 'line',
                 x0: today,
                 x1: today,
                 y0: 0,
                 y1: 1,
                 yref: 'paper',
-                line: {{ color: '#4CAF50', width: 2, dash: 'dash' }}
-            }}],
-            annotations: [{{
+                line: { color: '#4CAF50', width: 2, dash: 'dash' }
+            }],
+            annotations: [{
                 x: today,
                 y: 1,
                 yref: 'paper',
                 text: '今日',
                 showarrow: false,
                 yanchor: 'bottom',
-                font: {{ color: '#4CAF50' }}
-            }}],
+                font: { color: '#4CAF50' }
+            }],
             hovermode: 'x unified',
-            legend: {{
+            legend: {
                 orientation: 'h',
                 y: -0.15
-            }},
-            margin: {{ t: 30, b: 80 }}
-        }};
+            },
+            margin: { t: 30, b: 80 }
+        };
 
-        const config = {{
+        const config = {
             responsive: true,
             displayModeBar: true,
             modeBarButtonsToRemove: ['lasso2d', 'select2d'],
             displaylogo: false
-        }};
+        };
 
         Plotly.newPlot('chart', [balanceLine, incomeMarkers, expenseMarkers], layout, config);
     </script>
 </body>
-</html>'''
+</html>''')
+
+
+def generate_interactive_chart(data: dict, months_ahead: int = 6, output_path: str = None, open_file: bool = False) -> str:
+    """インタラクティブなHTML残高推移グラフを生成"""
+    # 日ごとの残高推移と大きな取引のマーカーデータ
+    series = _build_chart_series(data, months_ahead)
+    if series is None:
+        print("❌ 取引データがありません")
+        return None
+    _, dates, balances, big_transactions = series
+
+    # 今日の日付
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    # グラフデータをJSONに変換（区切りの空白を省いてHTMLを小さくする）
+    dates_json = json.dumps(dates, separators=(',', ':'))
+    balances_json = json.dumps(balances, separators=(',', ':'))
+    big_transactions_json = json.dumps(big_transactions, ensure_ascii=False, separators=(',', ':'))
+
+    # HTML生成
+    html_content = _HTML_TEMPLATE.substitute(
+        dates_json=dates_json,
+        balances_json=balances_json,
+        big_transactions_json=big_transactions_json,
+        today=today,
+    )
 
     # 保存
     if not output_path:
@@ -664,11 +715,12 @@ def main():
         generate_interactive_chart(data, args.chart_months, output_path, args.open)
         return
 
-    # デフォルト: 6ヶ月予測 + 危険ポイント
-    results = forecast_balance(data, 6)
+    # デフォルト: 6ヶ月予測 + 危険ポイント（インデックスは一度だけ作成して共有）
+    index = _build_balance_index(data)
+    results = forecast_balance(data, 6, index)
     print_forecast(results)
 
-    points = find_danger_points(data, 0)
+    points = find_danger_points(data, 0, index)
     print_danger_points(points)
 
 
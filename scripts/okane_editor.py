@@ -6,37 +6,94 @@ okane-backup JSONファイルの編集スクリプト
 
 import json
 import argparse
-from datetime import datetime
-import random
-import string
+import os
+import shutil
+import sys
+import tempfile
+import time
+from itertools import islice
+from operator import itemgetter
+
+# 取引の並び替えキー（'YYYY-MM-DD' は文字列順 = 日付順）
+_DATE_KEY = itemgetter('date')
+
+# 取引一覧の種別表示と行フォーマット
+_TYPE_LABEL = {'income': '収入', 'expense': '支出'}
+_ROW_FORMAT = "| `%s` | %s | %s | %s | %s |"
 
 
 def load_json(file_path: str) -> dict:
     """JSONファイルを読み込む"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(file_path, 'rb') as f:
+        data = json.loads(f.read().decode('utf-8'))
+    # 取引を日付順に並べておく（追加・編集でもこの順序を保つ）
+    data['transactions'].sort(key=_DATE_KEY)
+    return data
 
 
 def save_json(file_path: str, data: dict):
     """JSONファイルを保存"""
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    content = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+    # 一時ファイルに書いてから置き換える（リンク先を更新し、元の権限を引き継ぐ）
+    real_path = os.path.realpath(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(real_path), prefix='.okane-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        if os.path.exists(real_path):
+            shutil.copymode(real_path, tmp_path)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, real_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
 def format_currency(amount: int) -> str:
     """金額をフォーマット"""
-    if amount >= 0:
-        return f"¥{amount:,}"
-    return f"-¥{abs(amount):,}"
+    return f"¥{amount:,}" if amount >= 0 else f"-¥{-amount:,}"
 
 
 def generate_id() -> str:
     """ユニークIDを生成"""
-    timestamp = int(datetime.now().timestamp() * 1000)
-    random_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=9))
+    timestamp = time.time_ns() // 1_000_000
+    random_str = os.urandom(5).hex()[:9]
     return f"{timestamp}-{random_str}"
 
 
+def _bisect_date_left(transactions: list, date: str) -> int:
+    """日付順の取引リストで、date 以上の最初の取引の位置を求める"""
+    lo, hi = 0, len(transactions)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if transactions[mid]['date'] < date:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _bisect_date_right(transactions: list, date: str) -> int:
+    """日付順の取引リストで、date より後の最初の取引の位置を求める"""
+    lo, hi = 0, len(transactions)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if date < transactions[mid]['date']:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def _insert_sorted(transactions: list, tx: dict):
+    """日付順を保ったまま取引を挿入（同じ日付の取引の後ろに入れる）"""
+    transactions.insert(_bisect_date_right(transactions, tx['date']), tx)
+
+
 def add_transaction(data: dict, date: str, tx_type: str, amount: int, description: str) -> dict:
     """取引を追加"""
     new_tx = {
@@ -46,25 +103,26 @@ def add_transaction(data: dict, date: str, tx_type: str, amount: int, descriptio
         'amount': amount,
         'description': description
     }
-    data['transactions'].append(new_tx)
-    data['transactions'] = sorted(data['transactions'], key=lambda x: x['date'])
+    _insert_sorted(data['transactions'], new_tx)
     return new_tx
 
 
 def edit_transaction(data: dict, tx_id: str, date: str = None, tx_type: str = None,
                      amount: int = None, description: str = None) -> dict:
     """取引を編集"""
-    for tx in data['transactions']:
+    for i, tx in enumerate(data['transactions']):
         if tx['id'] == tx_id:
-            if date:
+            if date and date != tx['date']:
+                # 日付が変わる場合だけ位置を入れ替える
+                data['transactions'].pop(i)
                 tx['date'] = date
+                _insert_sorted(data['transactions'], tx)
             if tx_type:
                 tx['type'] = tx_type
             if amount is not None:
                 tx['amount'] = amount
             if description:
                 tx['description'] = description
-            data['transactions'] = sorted(data['transactions'], key=lambda x: x['date'])
             return tx
     return None
 
@@ -80,24 +138,31 @@ def delete_transaction(data: dict, tx_id: str) -> dict:
 
 def search_transactions(data: dict, keyword: str = None, tx_type: str = None,
                         start_date: str = None, end_date: str = None,
-                        min_amount: int = None, max_amount: int = None) -> list:
-    """取引を検索"""
+                        min_amount: int = None, max_amount: int = None,
+                        limit: int = None) -> list:
+    """取引を検索
+
+    新しい順に返す。limit を指定すると、その件数が見つかった時点で検索を打ち切る
+    """
     transactions = data['transactions']
+    keyword_lower = keyword.lower() if keyword else None
+
+    # 取引リストは日付順に保たれているので、期間は二分探索で範囲に変換する
+    lo = _bisect_date_left(transactions, start_date) if start_date else 0
+    hi = _bisect_date_right(transactions, end_date) if end_date else len(transactions)
 
-    if tx_type:
-        transactions = [t for t in transactions if t['type'] == tx_type]
-    if start_date:
-        transactions = [t for t in transactions if t['date'] >= start_date]
-    if end_date:
-        transactions = [t for t in transactions if t['date'] <= end_date]
-    if min_amount is not None:
-        transactions = [t for t in transactions if t['amount'] >= min_amount]
-    if max_amount is not None:
-        transactions = [t for t in transactions if t['amount'] <= max_amount]
-    if keyword:
-        transactions = [t for t in transactions if keyword.lower() in t['description'].lower()]
+    # 範囲を後ろから走査すれば新しい順になる
+    # 残りの条件を1回の走査で判定（安い比較を先に、部分文字列検索は最後に）
+    matches = (
+        t for t in (transactions[i] for i in range(hi - 1, lo - 1, -1))
+        if (not tx_type or t['type'] == tx_type)
+        and (min_amount is None or t['amount'] >= min_amount)
+        and (max_amount is None or t['amount'] <= max_amount)
+        and (keyword_lower is None or keyword_lower in t['description'].lower())
+    )
 
-    return sorted(transactions, key=lambda x: x['date'], reverse=True)
+    # 負の件数は0件として扱う
+    return list(islice(matches, None if limit is None else max(limit, 0)))
 
 
 def print_transactions(transactions: list, show_full_id: bool = False):
@@ -106,20 +171,32 @@ def print_transactions(transactions: list, show_full_id: bool = False):
         print("取引が見つかりません")
         return
 
-    print(f"\n## 取引一覧（{len(transactions)}件）\n")
-    print("| ID | 日付 | 種別 | 金額 | 説明 |")
-    print("|----|------|------|------|------|")
+    # 1行ずつ print せず、表全体をまとめて出力する
+    lines = [
+        f"\n## 取引一覧（{len(transactions)}件）\n",
+        "| ID | 日付 | 種別 | 金額 | 説明 |",
+        "|----|------|------|------|------|",
+    ]
     for t in transactions:
-        type_str = "収入" if t['type'] == 'income' else "支出"
         id_str = t['id'] if show_full_id else f"{t['id'][:15]}..."
-        print(f"| `{id_str}` | {t['date']} | {type_str} | {format_currency(t['amount'])} | {t['description']} |")
+        lines.append(_ROW_FORMAT % (id_str, t['date'], _TYPE_LABEL.get(t['type'], '支出'),
+                                    format_currency(t['amount']), t['description']))
+    lines.append('')
+    sys.stdout.write('\n'.join(lines))
 
 
 def print_summary(data: dict):
     """データサマリーを表示"""
     transactions = data['transactions']
-    income_total = sum(t['amount'] for t in transactions if t['type'] == 'income')
-    expense_total = sum(t['amount'] for t in transactions if t['type'] == 'expense')
+
+    # 収入・支出の合計を1回の走査で集計
+    income_total = 0
+    expense_total = 0
+    for t in transactions:
+        if t['type'] == 'income':
+            income_total += t['amount']
+        elif t['type'] == 'expense':
+            expense_total += t['amount']
 
     print(f"\n## サマリー\n")
     print(f"- 取引件数: {len(transactions)}件")
@@ -173,8 +250,9 @@ def main():
             start_date=args.start_date,
             end_date=args.end_date,
             min_amount=args.min_amount,
-            max_amount=args.max_amount
-        )[:args.limit]
+            max_amount=args.max_amount,
+            limit=args.limit
+        )
         print_transactions(transactions, args.full_id)
         print_summary(data)
         return
@@ -188,8 +266,9 @@ def main():
             start_date=args.start_date,
             end_date=args.end_date,
             min_amount=args.min_amount,
-            max_amount=args.max_amount
-        )[:args.limit]
+            max_amount=args.max_amount,
+            limit=args.limit
+        )
         print_transactions(transactions, args.full_id)
         return
 
@@ -255,7 +334,7 @@ def main():
         return
 
     # デフォルト: 一覧表示
-    transactions = search_transactions(data)[:args.limit]
+    transactions = search_transactions(data, limit=args.limit)
     print_transactions(transactions, args.full_id)
     print_summary(data)
 